@@ -1,4 +1,48 @@
-def lexer(input):
+import sys
+import time
+
+# how many characters (lexer) or tokens (parser) between checks of the time budget
+CHECK_EVERY = 1024
+
+
+class LimitExceeded(SyntaxError):
+    #raised when input goes over one of the budgets in Limits
+    def __init__(self, limit, maximum):
+        super().__init__(f"Input exceeds {limit} limit of {maximum}")
+        self.limit = limit
+        self.maximum = maximum
+
+
+class Limits:
+    '''
+    budgets for parsing untrusted input. max_depth has to stay well under half
+    of sys.getrecursionlimit(), since every nesting level costs two parser frames.
+    a limit of None switches that check off
+    '''
+
+    def __init__(self, max_tokens=100_000, max_depth=200, max_number_length=64,
+                 max_identifier_length=256, max_seconds=1.0):
+        self.max_tokens = max_tokens
+        self.max_depth = max_depth
+        self.max_number_length = max_number_length
+        self.max_identifier_length = max_identifier_length
+        self.max_seconds = max_seconds
+
+    def deadline(self):
+        if self.max_seconds is None:
+            return float('inf')
+        return time.perf_counter() + self.max_seconds
+
+
+def _limit(value):
+    return sys.maxsize if value is None else value
+
+
+def lexer(input, limits=None, deadline=None, positions=None):
+    '''
+    pass a list as positions to have the (start, end) character offsets of each
+    token appended to it, parallel to the returned tokens
+    '''
     i = 0
     n = len(input)
 
@@ -7,16 +51,41 @@ def lexer(input):
     if n == 0:
             raise SyntaxError("Empty Input")
 
+    if limits is None:
+        max_tokens = max_number_length = max_identifier_length = sys.maxsize
+        check_at = sys.maxsize
+    else:
+        max_tokens = _limit(limits.max_tokens)
+        max_number_length = _limit(limits.max_number_length)
+        max_identifier_length = _limit(limits.max_identifier_length)
+        if deadline is None:
+            deadline = limits.deadline()
+        check_at = 0
+
     while i < n:
+        # keyed on the input position so whitespace runs are budgeted too
+        if i >= check_at:
+            if len(tokens) > max_tokens:
+                raise LimitExceeded('token', max_tokens)
+            if time.perf_counter() >= deadline:
+                raise LimitExceeded('time', limits.max_seconds)
+            check_at = i + CHECK_EVERY
+
+        if positions is not None:
+            if len(positions) < len(tokens):
+                positions.append((start, i))
+            start = i
+
         char = input[i]
 
         if char.isdigit():
-            number_str = char
-            i += 1
+            number_str = ''
 
             while i < n and input[i].isdigit():
                 number_str += input[i]
                 i += 1
+                if len(number_str) > max_number_length:
+                    raise LimitExceeded('number length', max_number_length)
             
             tokens.append(('NUMBER', int(number_str)))
             continue
@@ -67,12 +136,13 @@ def lexer(input):
             continue
         
         if char.isalpha():
-            identifier_str = char
-            i += 1
+            identifier_str = ''
 
             while i < n and input[i].isalpha():
                 identifier_str += input[i]
                 i += 1
+                if len(identifier_str) > max_identifier_length:
+                    raise LimitExceeded('identifier length', max_identifier_length)
             
             tokens.append(('IDENTIFIER', identifier_str))
             continue
@@ -83,5 +153,11 @@ def lexer(input):
 
         else:
             raise SyntaxError("Unexpected Char")
+
+    if positions is not None and len(positions) < len(tokens):
+        positions.append((start, i))
+
+    if len(tokens) > max_tokens:
+        raise LimitExceeded('token', max_tokens)
     
     return tokens
\ No newline at end of file
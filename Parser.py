@@ -1,4 +1,7 @@
-from lexer import lexer
+import sys
+import time
+
+from lexer import lexer, Limits, LimitExceeded, CHECK_EVERY
 
 parse_table = {
     # <program>
@@ -31,7 +34,11 @@ parse_table = {
 }
 
 
-def parser(tokens, parse_table):
+def parser(tokens, parse_table, limits=None, deadline=None, spans=None):
+    '''
+    pass a dict as spans to have it filled with id(node) -> (first, end) token
+    indices for every expression node in the returned tree
+    '''
     position = [0]
 
     def peek():
@@ -44,25 +51,61 @@ def parser(tokens, parse_table):
         position[0] += 1
         return token
 
+    if limits is None and spans is None:
+        def track(start, result):
+            pass
+    else:
+        depth = [0]
+        check_at = [sys.maxsize if limits is None else 0]
+        if limits is None:
+            max_depth = sys.maxsize
+        else:
+            max_depth = sys.maxsize if limits.max_depth is None else limits.max_depth
+            if deadline is None:
+                deadline = limits.deadline()
+
+        def track(start, result):
+            # bookkeeping around a parenthesised expression starting at token index
+            # start: called with result None after '(' and with the node after ')'
+            if result is None:
+                depth[0] += 1
+                if depth[0] > max_depth:
+                    raise LimitExceeded('nesting depth', max_depth)
+                if position[0] > check_at[0]:
+                    if time.perf_counter() >= deadline:
+                        raise LimitExceeded('time', limits.max_seconds)
+                    check_at[0] = position[0] + CHECK_EVERY
+            else:
+                depth[0] -= 1
+                if spans is not None:
+                    spans[id(result)] = (start, position[0])
+
     def parse_expr():
         token_type, token_value = peek()
 
         if token_type == 'NUMBER':
             advance()
-            return ['NUMBER', token_value]
+            result = ['NUMBER', token_value]
         elif token_type == 'IDENTIFIER':
             advance()
-            return ['IDENTIFIER', token_value]
+            result = ['IDENTIFIER', token_value]
         elif token_type == 'LPAREN':
+            start = position[0]
             advance()  # consume '('
+            track(start, None)
             result = parse_paren_expr()
             if peek()[0] != 'RPAREN':
                 raise SyntaxError(f"Expected ')' but found '{peek()[0]}'")
             advance()  # consume ')'
+            track(start, result)
             return result
         else:
             raise SyntaxError(f"Unexpected token in <expr>: {token_type}")
 
+        if spans is not None:
+            spans[id(result)] = (position[0] - 1, position[0])
+        return result
+
     def parse_paren_expr():
         token_type, token_value = peek()
         if token_type == 'PLUS':
@@ -137,6 +180,24 @@ def parser(tokens, parse_table):
 
 parser_with_tree = parser
 
+
+def guarded_parse(source, limits=None):
+    '''
+    lexes and parses untrusted source under the budgets in limits (default Limits()).
+    going over any budget raises LimitExceeded, a subclass of SyntaxError
+    '''
+    if limits is None:
+        limits = Limits()
+    deadline = limits.deadline()
+    tokens = lexer(source, limits, deadline)
+    try:
+        return parser(tokens, parse_table, limits, deadline)
+    except RecursionError:
+        # max_depth is off, or too close to the interpreter's recursion limit
+        maximum = limits.max_depth if limits.max_depth is not None else sys.getrecursionlimit() // 2
+        raise LimitExceeded('nesting depth', maximum) from None
+
+
 if __name__ == "__main__":
     try:
         from lexer import lexer
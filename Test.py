@@ -1,9 +1,18 @@
+import asyncio
 import json
+import os
 import sys
-from typing import Dict, List, Any
-
-from .parser import parser, parse_table
-from .lexer import lexer
+import tempfile
+from typing import Any, Callable, Dict, List
+
+from .parser import parser, parse_table, guarded_parse
+from .lexer import lexer, Limits
+from .printer import dumps
+from .evaluator import evaluate, MemoCache
+from .server import ParseServer, read_frame, HEADER, MAX_FRAME
+from .profiler import profile, Profiler, ProfilingEvaluator
+from .scope import resolve
+from . import parser_gen
 
 class TestResult:
     def __init__(self, name: str, input_expr: str, expected_result: Any,
@@ -34,16 +43,26 @@ class MiniLispTester:
             "nested": [],
             "function": [],
             "error": [],
-            "edge": []
+            "edge": [],
+            "roundtrip": [],
+            "evaluation": [],
+            "server": [],
+            "profiler": [],
+            "scope": [],
+            "generator": []
         }
 
     def run_test(self, category: str, name: str, input_expr: str,
-                 expected_result: Any, should_error: bool = False):
+                 expected_result: Any, should_error: bool = False,
+                 parse_fn: Callable[[str], Any] = None):
 
         try:
-            tokens = lexer(input_expr)
-            tokens.append(('$', '$'))
-            parse = parser(tokens, parse_table)
+            if parse_fn is None:
+                tokens = lexer(input_expr)
+                tokens.append(('$', '$'))
+                parse = parser(tokens, parse_table)
+            else:
+                parse = parse_fn(input_expr)
 
             if should_error:
                 result = TestResult(
@@ -60,6 +79,9 @@ class MiniLispTester:
         except Exception as e:
             if should_error:
                 error_type = type(e).__name__
+                if getattr(e, 'limit', None) is not None:
+                    # LimitExceeded also reports which budget was hit
+                    error_type = f"{error_type}({e.limit})"
                 passed = error_type == expected_result or expected_result == "Error"
                 result = TestResult(
                     name, input_expr, expected_result, error_type, passed
@@ -74,6 +96,108 @@ class MiniLispTester:
         self.categories[category].append(result)
         return result
 
+    def run_roundtrip_test(self, name: str, tree: Any, indent: int = None,
+                           expected_source: str = None, expected_error: str = None):
+        # serializes tree with printer.dumps; checks the exact text when expected_source
+        # is given, that dumps raises expected_error (an exception name) when that is
+        # given, and otherwise that lexer + parser read the text back into the same tree
+        try:
+            source = dumps(tree, indent)
+            shown = source if len(source) <= 80 else source[:77] + "..."
+            if expected_error is not None:
+                result = TestResult(name, repr(tree)[:80], expected_error, source,
+                                    False, "Expected error but serializing succeeded")
+            else:
+                if expected_source is not None:
+                    actual = source
+                    expected = expected_source
+                else:
+                    actual = parser(lexer(source), parse_table)
+                    expected = tree
+                passed = actual == expected
+                result = TestResult(name, shown, "round-trip" if passed else expected,
+                                    "round-trip" if passed else actual, passed)
+        except Exception as e:
+            if expected_error is not None:
+                error_type = type(e).__name__
+                result = TestResult(name, repr(tree)[:80], expected_error, error_type,
+                                    error_type == expected_error)
+            else:
+                result = TestResult(name, repr(tree)[:80], "round-trip", None,
+                                    False, f"{type(e).__name__}: {str(e)}")
+
+        self.results.append(result)
+        self.categories["roundtrip"].append(result)
+        return result
+
+    def run_evaluation_test(self, name: str, input_expr: str, expected_result: Any):
+        # evaluates with and without a MemoCache; both must give expected_result,
+        # compared by type as well as value (True == 1 in Python)
+        try:
+            tree = parser(lexer(input_expr), parse_table)
+            plain = evaluate(tree)
+            memoized = evaluate(tree, memo=MemoCache())
+            actual = plain if type(plain) is type(memoized) and plain == memoized else [plain, memoized]
+            passed = type(actual) is type(expected_result) and actual == expected_result
+            result = TestResult(name, input_expr, expected_result, actual, passed,
+                                "" if actual is plain else "memoized result differs from plain")
+        except Exception as e:
+            result = TestResult(name, input_expr, expected_result, None,
+                                False, f"{type(e).__name__}: {str(e)}")
+
+        self.results.append(result)
+        self.categories["evaluation"].append(result)
+        return result
+
+    def run_server_test(self, name: str, payloads: List[bytes], expected: List[Any],
+                        **options):
+        # starts a ParseServer on an ephemeral port, writes the raw payloads in one go
+        # and reads back len(expected) replies. each reply is summarised as its tree,
+        # or its error name when ok is false, and a closed stream as "EOF"
+        async def exchange():
+            service = ParseServer(workers=1, **options)
+            handlers = []
+
+            async def handle(reader, writer):
+                handlers.append(asyncio.current_task())
+                await service.handle(reader, writer)
+
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            try:
+                port = server.sockets[0].getsockname()[1]
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.write(b''.join(payloads))
+                await writer.drain()
+                replies = []
+                for _ in expected:
+                    frame = await asyncio.wait_for(read_frame(reader), 10)
+                    if frame is None:
+                        replies.append("EOF")
+                        break
+                    reply = json.loads(frame)
+                    replies.append(reply["tree"] if reply["ok"] else reply["error"])
+                writer.close()
+                # let the server see the close and finish before the loop shuts down
+                await asyncio.wait_for(asyncio.gather(*handlers), 10)
+                return replies
+            finally:
+                server.close()
+                await server.wait_closed()
+                service.close()
+
+        shown = repr(b''.join(payloads))
+        shown = shown if len(shown) <= 80 else shown[:77] + "..."
+        try:
+            actual = asyncio.run(exchange())
+            result = TestResult(name, shown, expected, actual, actual == expected)
+        except Exception as e:
+            result = TestResult(name, shown, expected, None,
+                                False, f"{type(e).__name__}: {str(e)}")
+
+        self.results.append(result)
+        self.categories["server"].append(result)
+        return result
+
     def _compare_results(self, actual: Any, expected: Any) -> bool:
         return str(actual) == str(expected) or actual == expected
 
@@ -326,6 +450,353 @@ def run_all_tests():
          ['IDENTIFIER', 'y'], ['IDENTIFIER', 'z']]
     )
 
+    # C.2 RESOURCE LIMITS (guarded_parse)
+
+    tester.run_test(
+        "error", "limit_tokens", "(f " + "x " * 50 + ")",
+        "LimitExceeded(token)", should_error=True,
+        parse_fn=lambda source: guarded_parse(source, Limits(max_tokens=20))
+    )
+
+    tester.run_test(
+        "error", "limit_nesting_depth", "(" * 1000,
+        "LimitExceeded(nesting depth)", should_error=True,
+        parse_fn=guarded_parse
+    )
+
+    tester.run_test(
+        "error", "limit_number_length", "(+ 1 12345)",
+        "LimitExceeded(number length)", should_error=True,
+        parse_fn=lambda source: guarded_parse(source, Limits(max_number_length=4))
+    )
+
+    tester.run_test(
+        "error", "limit_single_digit_counted", "7",
+        "LimitExceeded(number length)", should_error=True,
+        parse_fn=lambda source: guarded_parse(source, Limits(max_number_length=0))
+    )
+
+    tester.run_test(
+        "error", "limit_identifier_length", "(f abcdefghij)",
+        "LimitExceeded(identifier length)", should_error=True,
+        parse_fn=lambda source: guarded_parse(source, Limits(max_identifier_length=8))
+    )
+
+    tester.run_test(
+        "error", "limit_time", " " * 5000 + "(+ 1 2)",
+        "LimitExceeded(time)", should_error=True,
+        parse_fn=lambda source: guarded_parse(source, Limits(max_seconds=0))
+    )
+
+    # guarded_parse with generous limits must build the same tree as parser
+    generous = Limits(max_tokens=10_000, max_depth=400, max_number_length=4000,
+                      max_identifier_length=4000, max_seconds=60)
+    for name, source in [
+        ("guarded_nested_let", "(≜ x 5 (≜ y 10 (+ x y)))"),
+        ("guarded_application", "((λ x (+ x 1)) 5)"),
+        ("guarded_deep", "(+ 1 " * 150 + "2" + ")" * 150),
+        ("guarded_large_number", "9" * 1000),
+    ]:
+        tester.run_test(
+            "edge", name, source,
+            parser(lexer(source), parse_table),
+            parse_fn=lambda source: guarded_parse(source, generous)
+        )
+
+    # GENERATED PARSER (parser_gen) must agree with the hand-written one
+
+    def outcome(parse, source):
+        try:
+            return parse(lexer(source))
+        except Exception as e:
+            return type(e).__name__
+
+    generated = parser_gen.load_parser(cache_dir=None)
+    for category in ("basic", "nested", "function", "error", "edge"):
+        for existing in list(tester.categories[category]):
+            tester.run_test(
+                "generator", f"generated_{existing.name}", existing.input_expr,
+                outcome(lambda tokens: parser(tokens, parse_table), existing.input_expr),
+                parse_fn=lambda source: outcome(generated.parse, source)
+            )
+
+    def conflicts_with(production):
+        # check_ll1 on parse_table with (<paren-expr>, NUMBER) set to production
+        table = dict(parse_table)
+        table[('<paren-expr>', 'NUMBER')] = production.split()
+        return parser_gen.check_ll1(table)
+
+    tester.run_test(
+        "generator", "ll1_table_has_no_conflicts", "<expr> <more_expr>", [],
+        parse_fn=conflicts_with
+    )
+    tester.run_test(
+        "generator", "ll1_first_first_conflict", "NUMBER <expr>",
+        ['<paren-expr> on NUMBER: NUMBER <expr> | <expr> <more_expr>'],
+        parse_fn=conflicts_with
+    )
+
+    def cached_parse(source, cache_dir):
+        # drop the in-process copy so load_parser goes back to cache_dir
+        parser_gen._loaded.pop(parser_gen.grammar_hash(parse_table), None)
+        module = parser_gen.load_parser(cache_dir=cache_dir)
+        return [module.parse(lexer(source)), getattr(module, '__file__', None) is not None]
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        tester.run_test(
+            "generator", "generated_parser_cached_on_disk", "(+ 1 x)",
+            [['PLUS', ['NUMBER', 1], ['IDENTIFIER', 'x']], True],
+            parse_fn=lambda source: cached_parse(source, cache_dir)
+        )
+        # a cache path below a regular file can never be created
+        unwritable = os.path.join(cache_dir, "not_a_directory", "cache")
+        open(os.path.dirname(unwritable), 'w').close()
+        tester.run_test(
+            "generator", "generated_parser_unwritable_cache", "(+ 1 x)",
+            [['PLUS', ['NUMBER', 1], ['IDENTIFIER', 'x']], False],
+            parse_fn=lambda source: cached_parse(source, unwritable)
+        )
+
+    # SERIALIZER ROUND-TRIP (printer.dumps)
+
+    for name, source in [
+        ("roundtrip_number", "42"),
+        ("roundtrip_arithmetic", "(+ (× 2 3) (− 10 4))"),
+        ("roundtrip_conditional", "(? (= x 0) 1 0)"),
+        ("roundtrip_application", "((λ x (+ x 1)) 5)"),
+        ("roundtrip_multi_arg", "(f (g x) y z)"),
+        ("roundtrip_recursive_let",
+         "(≜ fact (λ n (? (= n 0) 1 (× n (fact (− n 1))))) (fact 5))"),
+    ]:
+        tree = parser(lexer(source), parse_table)
+        tester.run_roundtrip_test(name + "_compact", tree)
+        tester.run_roundtrip_test(name + "_indented", tree, indent=2)
+
+    # built in a loop, deeper than any recursive printer could go, but still
+    # shallow enough for the recursive parser to read back
+    deep = ['NUMBER', 1]
+    for _ in range(300):
+        deep = ['PLUS', deep, ['LAMBDA', 'y', ['IDENTIFIER', 'y']]]
+    tester.run_roundtrip_test("roundtrip_deep_compact", deep)
+    tester.run_roundtrip_test("roundtrip_deep_indented", deep, indent=1)
+
+    very_deep = ['NUMBER', 1]
+    for _ in range(100_000):
+        very_deep = ['PLUS', very_deep, ['IDENTIFIER', 'x']]
+    tester.run_roundtrip_test(
+        "serialize_very_deep", very_deep,
+        expected_source="(+ " * 100_000 + "1" + " x)" * 100_000
+    )
+
+    tester.run_roundtrip_test(
+        "finalized_tree_format", ['PLUS', 2, ['COND', ['EQUALS', 'y', 0], 1, 'y']],
+        expected_source="(+ 2 (? (= y 0) 1 y))"
+    )
+
+    # the lexer would read a leading λ as LAMBDA, so such names cannot be written
+    tester.run_roundtrip_test(
+        "serialize_lambda_prefixed_name", ['LAMBDA', 'λx', ['IDENTIFIER', 'y']],
+        expected_error="ValueError"
+    )
+    tester.run_roundtrip_test(
+        "serialize_lambda_prefixed_identifier", ['PLUS', ['IDENTIFIER', 'λy'], 1],
+        expected_error="ValueError"
+    )
+
+    # EVALUATION (plain and memoized application must agree)
+
+    tester.run_evaluation_test("eval_arithmetic", "(+ (× 2 3) (− 10 4))", 12)
+    tester.run_evaluation_test("eval_equals_bool", "(= 1 1)", True)
+    tester.run_evaluation_test(
+        "eval_memo_bool_vs_int", "(≜ id (λ x x) (≜ a (id 1) (id (= 1 1))))", True
+    )
+    tester.run_evaluation_test(
+        "eval_memo_int_after_bool", "(≜ id (λ x x) (≜ a (id (= 1 1)) (id 1)))", 1
+    )
+    tester.run_evaluation_test(
+        "eval_recursive_let",
+        "(≜ fact (λ n (? (= n 0) 1 (× n (fact (− n 1))))) (fact 10))", 3628800
+    )
+    tester.run_evaluation_test(
+        "eval_fibonacci",
+        "(≜ fib (λ n (? (= n 0) 0 (? (= n 1) 1 (+ (fib (− n 1)) (fib (− n 2)))))) (fib 15))",
+        610
+    )
+
+    # PARSE SERVER (framing, error replies, backpressure, batching)
+
+    def frame(source):
+        payload = source.encode('utf-8') if isinstance(source, str) else source
+        return HEADER.pack(len(payload)) + payload
+
+    tester.run_server_test(
+        "server_parse", [frame("(+ 2 3)")],
+        [['PLUS', ['NUMBER', 2], ['NUMBER', 3]]]
+    )
+    tester.run_server_test(
+        "server_syntax_error", [frame("(+ 2"), frame("x")],
+        ["SyntaxError", ['IDENTIFIER', 'x']]
+    )
+    tester.run_server_test(
+        "server_bad_utf8", [frame(b"(+ 2 \xff)"), frame("42")],
+        ["UnicodeDecodeError", ['NUMBER', 42]]
+    )
+    # the first request starts a worker while the connection is open; the
+    # connection must still close once the oversized frame has been answered
+    tester.run_server_test(
+        "server_oversized_frame", [frame("7"), HEADER.pack(MAX_FRAME + 1)],
+        [['NUMBER', 7], "ProtocolError", "EOF"]
+    )
+    # more requests than max_pipeline and max_batch, so reading pauses and
+    # several batches are needed; replies must still come back in order
+    tester.run_server_test(
+        "server_pipelined_in_order", [frame(f"(+ {i} x)") for i in range(50)],
+        [['PLUS', ['NUMBER', i], ['IDENTIFIER', 'x']] for i in range(50)],
+        max_pipeline=4, max_batch=8
+    )
+
+    # LEXICAL ADDRESSING (scope.resolve)
+
+    def resolved(source):
+        return resolve(parser(lexer(source), parse_table))
+
+    tester.run_test(
+        "scope", "resolve_nested_lambdas", "(λ x (λ y (+ x y)))",
+        ['LAMBDA', 'x',
+         ['LAMBDA', 'y', ['PLUS', ['IDENTIFIER', 'x', (1, 0)], ['IDENTIFIER', 'y', (0, 0)]],
+          1, (('x', 0, 0),)],
+         1, ()],
+        parse_fn=lambda source: resolved(source).tree
+    )
+    # capture sets of the a, b and c lambdas, then the address of the innermost a:
+    # a is captured by every lambda it crosses, addressed from where each is created
+    tester.run_test(
+        "scope", "resolve_capture_across_two_lambdas", "(λ a (λ b (λ c a)))",
+        [(), (('a', 0, 0),), (('a', 1, 0),), (2, 0)],
+        parse_fn=lambda source: (lambda outer: [
+            outer[4], outer[2][4], outer[2][2][4], outer[2][2][2][2]
+        ])(resolved(source).tree)
+    )
+    tester.run_test(
+        "scope", "resolve_let_shadows_parameter", "(λ x (≜ x 5 x))",
+        ['LAMBDA', 'x', ['LET', 'x', ['NUMBER', 5], ['IDENTIFIER', 'x', (0, 1)], 1], 2, ()],
+        parse_fn=lambda source: resolved(source).tree
+    )
+    tester.run_test(
+        "scope", "resolve_shadow_ends_with_let", "(λ x (+ (≜ x 5 x) x))",
+        ['LAMBDA', 'x',
+         ['PLUS', ['LET', 'x', ['NUMBER', 5], ['IDENTIFIER', 'x', (0, 1)], 1],
+          ['IDENTIFIER', 'x', (0, 0)]],
+         2, ()],
+        parse_fn=lambda source: resolved(source).tree
+    )
+    tester.run_test(
+        "scope", "resolve_unbound_names", "(+ y ((λ x (+ x z)) y))",
+        (['y', 'z'],
+         ['PLUS', ['IDENTIFIER', 'y', None],
+          [['LAMBDA', 'x', ['PLUS', ['IDENTIFIER', 'x', (0, 0)], ['IDENTIFIER', 'z', None]], 1, ()],
+           ['IDENTIFIER', 'y', None]]]),
+        parse_fn=lambda source: (resolved(source).unbound, resolved(source).tree)
+    )
+
+    # PROFILER (a fake clock ticking 1 ms per reading makes the times exact)
+
+    def profiled(source):
+        ticks = iter(range(1_000_000))
+        return profile(source, clock=lambda: next(ticks) / 1000)[1]
+
+    fib10 = "(≜ fib (λ n (? (= n 0) 0 (? (= n 1) 1 (+ (fib (− n 1)) (fib (− n 2)))))) (fib 10))"
+    fib_label = "(λ n (? (= n 0) 0 (? (= n 1) 1 (+ (fib … @1:8"
+
+    tester.run_test(
+        "profiler", "profile_fib_call_counts", fib10,
+        [('lambda', fib_label, 177), ('program', '<program>', 1),
+         ('site', '(fib (− n 1)) @1:42', 88), ('site', '(fib (− n 2)) @1:56', 88),
+         ('site', '(fib 10) @1:74', 1)],
+        parse_fn=lambda source: sorted(
+            (row['kind'], row['label'], row['calls']) for row in profiled(source).report()
+        )
+    )
+    tester.run_test(
+        "profiler", "profile_folded_stacks", fib10,
+        ["<program> 2000",
+         "<program>;(fib 10) @1:74 2000",
+         f"<program>;(fib 10) @1:74;{fib_label} 3000"],
+        parse_fn=lambda source: profiled(source).folded_stacks()[:3]
+    )
+    tester.run_test(
+        "profiler", "profile_format_report", fib10,
+        f"     177    705.000    353.000      177  lambda  {fib_label}",
+        parse_fn=lambda source: profiled(source).format_report().splitlines()[2]
+    )
+
+    def reused_profiler(source):
+        # fresh trees each round, so freed node ids get reused by later programs
+        profiler = Profiler()
+        for _ in range(3):
+            for name in source.split():
+                tree = parser(lexer(f"((λ {name} {name}) 1)"), parse_table)
+                ProfilingEvaluator(profiler).evaluate(tree)
+                del tree
+        calls = {}
+        for entry in profiler.entries.values():
+            if entry.kind == 'lambda':
+                calls[entry.label] = calls.get(entry.label, 0) + entry.calls
+        return calls
+
+    tester.run_test(
+        "profiler", "profiler_reused_across_programs", "a b c d",
+        {'λ a': 3, 'λ b': 3, 'λ c': 3, 'λ d': 3},
+        parse_fn=reused_profiler
+    )
+
+    # MEMOIZED EVALUATION (MemoCache bounds and statistics) AND EVALUATION ERRORS
+
+    def memo_stats(source, maxsize=4096):
+        memo = MemoCache(maxsize=maxsize)
+        value = evaluate(parser(lexer(source), parse_table), memo=memo)
+        counts = [(entry["lambda"], entry["hits"], entry["misses"]) for entry in memo.stats()]
+        return [value, counts, len(memo.entries)]
+
+    # naive fibonacci is linear once memoized: one miss per n from 0 to N
+    for n, value in ((10, 55), (20, 6765)):
+        tester.run_test(
+            "evaluation", f"memo_fibonacci_{n}_linear",
+            fib10.replace("(fib 10)", f"(fib {n})"),
+            [value, [('λ n #1', n - 2, n + 1)], n + 1],
+            parse_fn=memo_stats
+        )
+
+    # id is applied to 1, 2, 3 and then 1 again; with room for two entries the
+    # first result has been evicted by then, with room for three it is a hit
+    repeated = "(≜ id (λ x x) (+ (id 1) (+ (id 2) (+ (id 3) (id 1)))))"
+    tester.run_test(
+        "evaluation", "memo_lru_evicts", repeated,
+        [7, [('λ x #1', 0, 4)], 2],
+        parse_fn=lambda source: memo_stats(source, maxsize=2)
+    )
+    tester.run_test(
+        "evaluation", "memo_lru_keeps_recent", repeated,
+        [7, [('λ x #1', 1, 3)], 3],
+        parse_fn=lambda source: memo_stats(source, maxsize=3)
+    )
+    tester.run_test(
+        "evaluation", "memo_stats_per_lambda", "(≜ f (λ x (× x x)) (≜ g (λ y y) (+ (f 2) (+ (f 2) (g 2)))))",
+        [10, [('λ x #1', 1, 1), ('λ y #2', 0, 1)], 2],
+        parse_fn=memo_stats
+    )
+
+    for name, source in [
+        ("eval_closure_operand", "(+ (λ x x) 1)"),
+        ("eval_closure_right_operand", "(× 2 (λ y y))"),
+        ("eval_apply_number", "(5 3)"),
+        ("eval_unbound", "(+ y 1)"),
+    ]:
+        tester.run_test(
+            "evaluation", name, source, "EvaluationError", should_error=True,
+            parse_fn=lambda source: evaluate(parser(lexer(source), parse_table))
+        )
+
     return tester
 
 
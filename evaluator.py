@@ -0,0 +1,307 @@
+import time
+from collections import OrderedDict
+
+from lexer import lexer
+from parser import parser, parse_table
+from scope import resolve
+
+
+# evaluator
+# evaluates trees from parser() after running them through scope.resolve, so
+# variables are read from flat frames by (depth, slot) instead of by name.
+# a frame is a list [parent_frame, slot0, slot1, ...].
+#
+# values are ints, bools (from =) and closures. applying a function to several
+# arguments, (f a b), applies it to a and then the result to b.
+#
+# evaluation runs on an explicit work stack rather than Python recursion, so a
+# program can recurse far past sys.getrecursionlimit(); it is bounded by
+# MAX_STACK pending items instead. a tail call adds nothing to that stack.
+#
+# the language has no side effects, so applying the same closure to the same
+# argument always gives the same result. passing a MemoCache turns on memoized
+# application, which makes e.g. naive recursive fibonacci run in linear time.
+
+class EvaluationError(Exception):
+    #raised when a well formed tree cannot be evaluated (unbound name, bad application)
+    pass
+
+
+class Closure:
+    __slots__ = ('node', 'frame')
+
+    def __init__(self, node, frame):
+        self.node = node      # annotated LAMBDA node
+        self.frame = frame    # frame the lambda was created in
+
+    def __repr__(self):
+        return f"<λ {self.node[1]}>"
+
+
+_UNSET = object()
+_MISSING = object()
+
+# upper bound on pending work items; a program recursing deeper than this (in
+# non-tail position) raises EvaluationError instead of exhausting memory
+MAX_STACK = 1_000_000
+
+# work item kinds for Evaluator._eval:
+#   (_EVAL, node, frame)          evaluate node, push its value
+#   (_APPLY, None, None)          pop argument and function, call it
+#   (_BINARY, head, None)         pop two values, push the result of the operator
+#   (_BRANCH, node, frame)        pop the test of a CONDITIONAL, evaluate one branch
+#   (_BIND, index, frame)         pop a LET value into frame[index]
+#   (_STORE, closure, argument)   memoize the value on top of the stack
+#   (_EXIT, None, None)           close the innermost profiler entry
+_EVAL, _APPLY, _BINARY, _BRANCH, _BIND, _STORE, _EXIT = range(7)
+_APPLY_ITEM = (_APPLY, None, None)
+_EXIT_ITEM = (_EXIT, None, None)
+
+BINARY_OPERATORS = {'PLUS', 'MINUS', 'MULT', 'EQUALS'}
+
+
+class LambdaStats:
+    def __init__(self, node, label):
+        self.node = node      # held so the id() key in MemoCache.per_lambda stays unique
+        self.label = label
+        self.hits = 0
+        self.misses = 0
+
+    def to_dict(self):
+        total = self.hits + self.misses
+        return {
+            "lambda": self.label,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class MemoCache:
+    '''
+    bounded LRU store of (closure, argument) -> result, with hit/miss counts
+    kept per lambda in the source. the argument's type is part of the key, since
+    True == 1 and hash(True) == hash(1) would otherwise share an entry
+    '''
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.per_lambda = {}
+
+    def _stats_for(self, node):
+        stats = self.per_lambda.get(id(node))
+        if stats is None:
+            stats = LambdaStats(node, f"λ {node[1]} #{len(self.per_lambda) + 1}")
+            self.per_lambda[id(node)] = stats
+        return stats
+
+    def get(self, closure, argument):
+        key = (closure, type(argument), argument)
+        value = self.entries.get(key, _MISSING)
+        stats = self._stats_for(closure.node)
+        if value is _MISSING:
+            stats.misses += 1
+        else:
+            stats.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, closure, argument, value):
+        self.entries[(closure, type(argument), argument)] = value
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        report = [stats.to_dict() for stats in self.per_lambda.values()]
+        report.sort(key=lambda entry: entry["hits"] + entry["misses"], reverse=True)
+        return report
+
+    def clear(self):
+        self.entries.clear()
+        self.per_lambda.clear()
+
+
+class Evaluator:
+    def __init__(self, env=None, memo=None):
+        self.env = env or {}
+        self.memo = memo
+        self.profiler = None
+        self.max_stack = MAX_STACK
+
+    def evaluate(self, tree):
+        try:
+            resolution = resolve(tree)
+        except RecursionError:
+            raise EvaluationError("Program nests too deeply to resolve") from None
+        return self.run(resolution)
+
+    def run(self, resolution):
+        missing = [name for name in resolution.unbound if name not in self.env]
+        if missing:
+            raise EvaluationError(f"Unbound variable(s): {', '.join(missing)}")
+        frame = [None] + [_UNSET] * resolution.frame_size
+        return self._eval(resolution.tree, frame)
+
+    def _eval(self, node, frame):
+        '''
+        evaluates node in frame. pending work is kept on an explicit stack of
+        (op, first, second) items and intermediate results on a value stack, so
+        recursion in the program does not use Python's call stack
+        '''
+        env = self.env
+        memo = self.memo
+        profiler = self.profiler
+        max_stack = self.max_stack
+
+        values = []
+        emit = values.append
+        take = values.pop
+        todo = [(_EVAL, node, frame)]
+        push = todo.append
+        pop = todo.pop
+
+        while todo:
+            op, first, second = pop()
+
+            if op == _EVAL:
+                node, frame = first, second
+                head = node[0]
+
+                if head == 'NUMBER':
+                    emit(node[1])
+
+                elif head == 'IDENTIFIER':
+                    address = node[2]
+                    if address is None:
+                        emit(env[node[1]])
+                        continue
+                    depth, slot = address
+                    for _ in range(depth):
+                        frame = frame[0]
+                    value = frame[slot + 1]
+                    if value is _UNSET:
+                        raise EvaluationError(f"Variable '{node[1]}' used before it is bound")
+                    emit(value)
+
+                elif isinstance(head, list):
+                    if profiler is not None:
+                        profiler.enter(node, 'site')
+                        push(_EXIT_ITEM)
+                    for argument in node[:0:-1]:
+                        push(_APPLY_ITEM)
+                        push((_EVAL, argument, frame))
+                    push((_EVAL, head, frame))
+
+                elif head in BINARY_OPERATORS:
+                    push((_BINARY, head, None))
+                    push((_EVAL, node[2], frame))
+                    push((_EVAL, node[1], frame))
+
+                elif head == 'CONDITIONAL':
+                    push((_BRANCH, node, frame))
+                    push((_EVAL, node[1], frame))
+
+                elif head == 'LAMBDA':
+                    if profiler is not None:
+                        profiler.allocated()
+                    emit(Closure(node, frame))
+
+                elif head == 'LET':
+                    push((_EVAL, node[3], frame))
+                    push((_BIND, node[4] + 1, frame))
+                    push((_EVAL, node[2], frame))
+
+                else:
+                    raise EvaluationError(f"Unknown node in tree: {head}")
+
+            elif op == _APPLY:
+                argument = take()
+                function = take()
+                if not isinstance(function, Closure):
+                    raise EvaluationError(f"Cannot apply non-function value {function!r}")
+                if memo is not None:
+                    value = memo.get(function, argument)
+                    if value is not _MISSING:
+                        emit(value)
+                        continue
+                    push((_STORE, function, argument))
+                if len(todo) > max_stack:
+                    raise EvaluationError(
+                        f"Recursion too deep: evaluation stack exceeded {max_stack} entries"
+                    )
+                node = function.node
+                if profiler is not None:
+                    profiler.enter(node, 'lambda')
+                    profiler.allocated()
+                    push(_EXIT_ITEM)
+                frame = [function.frame, argument] + [_UNSET] * (node[3] - 1)
+                push((_EVAL, node[2], frame))
+
+            elif op == _BINARY:
+                right = take()
+                left = values[-1]
+                try:
+                    if first == 'PLUS':
+                        values[-1] = left + right
+                    elif first == 'MINUS':
+                        values[-1] = left - right
+                    elif first == 'MULT':
+                        values[-1] = left * right
+                    else:
+                        values[-1] = left == right
+                except TypeError:
+                    # e.g. a closure as an operand
+                    raise EvaluationError(
+                        f"Cannot apply {first} to {left!r} and {right!r}"
+                    ) from None
+
+            elif op == _BRANCH:
+                node = first
+                push((_EVAL, node[2] if take() else node[3], second))
+
+            elif op == _BIND:
+                second[first] = take()
+
+            elif op == _STORE:
+                memo.put(first, second, values[-1])
+
+            else:
+                profiler.exit()
+
+        return take()
+
+
+def evaluate(tree, env=None, memo=None):
+    '''
+    evaluates a parser() tree. pass a MemoCache as memo to memoize applications
+    '''
+    return Evaluator(env, memo).evaluate(tree)
+
+
+if __name__ == "__main__":
+    fib = "(≜ fib (λ n (? (= n 0) 0 (? (= n 1) 1 (+ (fib (− n 1)) (fib (− n 2)))))) (fib N))"
+
+    print("Naive fibonacci, plain vs memoized application")
+    print("=" * 60)
+    for n in (10, 18, 22):
+        tree = parser(lexer(fib.replace("N", str(n))), parse_table)
+
+        start = time.perf_counter()
+        plain = evaluate(tree)
+        plain_time = time.perf_counter() - start
+
+        memo = MemoCache()
+        start = time.perf_counter()
+        memoized = evaluate(tree, memo=memo)
+        memo_time = time.perf_counter() - start
+
+        assert plain == memoized
+        print(f"fib {n:>2} = {plain:<6}  plain {plain_time * 1000:8.2f} ms   "
+              f"memoized {memo_time * 1000:6.2f} ms")
+        for entry in memo.stats():
+            print(f"    {entry['lambda']}: {entry['hits']} hits, {entry['misses']} misses")
+
+    # too slow without the cache, and deeper than Python's recursion limit
+    tree = parser(lexer(fib.replace("N", "1000")), parse_table)
+    print(f"fib 1000 memoized has {len(str(evaluate(tree, memo=MemoCache())))} digits")
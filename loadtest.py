@@ -0,0 +1,126 @@
+import argparse
+import asyncio
+import json
+import time
+
+from server import read_frame, write_frame
+
+
+# load-test client for server.py
+# opens a number of connections, keeps up to `window` requests pipelined on each,
+# and reports latency percentiles and overall throughput.
+
+SAMPLE_PROGRAMS = [
+    "42",
+    "(+ 2 3)",
+    "(+ (× 2 3) 4)",
+    "(? (= x 0) 1 0)",
+    "(λ x (× x (+ x 1)))",
+    "(≜ x 5 (≜ y 10 (+ x y)))",
+    "((λ x (+ x 1)) 5)",
+    "(f x y z)",
+    "(+ 2",
+]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def _open(host, port, unix_path):
+    if unix_path:
+        return await asyncio.open_unix_connection(unix_path)
+    return await asyncio.open_connection(host, port)
+
+
+async def run_connection(host, port, unix_path, requests, window, latencies, errors):
+    '''
+    sends `requests` frames over one connection with at most `window` unanswered at a time
+    '''
+    reader, writer = await _open(host, port, unix_path)
+    sent_at = []
+    slots = asyncio.Semaphore(window)
+
+    async def send_all():
+        for i in range(requests):
+            await slots.acquire()
+            source = SAMPLE_PROGRAMS[i % len(SAMPLE_PROGRAMS)]
+            sent_at.append(time.perf_counter())
+            write_frame(writer, source.encode('utf-8'))
+            await writer.drain()
+
+    sender = asyncio.create_task(send_all())
+    for i in range(requests):
+        payload = await read_frame(reader)
+        if payload is None:
+            raise ConnectionError("Server closed the connection early")
+        latencies.append(time.perf_counter() - sent_at[i])
+        if not json.loads(payload)["ok"]:
+            errors[0] += 1
+        slots.release()
+
+    await sender
+    writer.close()
+    await writer.wait_closed()
+
+
+async def load_test(host='127.0.0.1', port=7878, unix_path=None,
+                    connections=16, requests=2000, window=8):
+    latencies = []
+    errors = [0]
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        run_connection(host, port, unix_path, requests, window, latencies, errors)
+        for _ in range(connections)
+    ))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    total = len(latencies)
+    return {
+        "requests": total,
+        "error_responses": errors[0],
+        "seconds": elapsed,
+        "requests_per_second": total / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def print_report(report):
+    print("=" * 60)
+    print("MINILISP PARSE SERVER LOAD TEST")
+    print("=" * 60)
+    print(f"  Requests:        {report['requests']}")
+    print(f"  Error responses: {report['error_responses']}")
+    print(f"  Elapsed:         {report['seconds']:.3f} s")
+    print(f"  Throughput:      {report['requests_per_second']:.0f} req/s")
+    print(f"  Latency p50:     {report['p50_ms']:.3f} ms")
+    print(f"  Latency p99:     {report['p99_ms']:.3f} ms")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Load test for the MiniLisp parse server")
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=7878)
+    arg_parser.add_argument('--unix', dest='unix_path', default=None)
+    arg_parser.add_argument('--connections', type=int, default=16)
+    arg_parser.add_argument('--requests', type=int, default=2000,
+                            help="requests per connection")
+    arg_parser.add_argument('--window', type=int, default=8,
+                            help="pipelined requests per connection")
+    arg_parser.add_argument('--json', dest='json_path', default=None,
+                            help="also save the report to this file")
+    args = arg_parser.parse_args()
+
+    report = asyncio.run(load_test(args.host, args.port, args.unix_path,
+                                   args.connections, args.requests, args.window))
+    print_report(report)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
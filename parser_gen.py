@@ -0,0 +1,454 @@
+import hashlib
+import importlib.util
+import os
+import timeit
+import types
+
+from lexer import lexer
+from parser import parser, parse_table
+
+
+# parser generator
+# reads the LL(1) parse_table from parser.py, checks it, and emits a Python module
+# with one function per production. tokens are mapped to small integer kinds once,
+# and every nonterminal dispatches through a tuple indexed by kind instead of
+# walking if/elif chains. the emitted module is cached on disk under a hash of the
+# table, so it is only regenerated when the grammar changes.
+
+GENERATOR_VERSION = 1
+EPSILON = ''
+END = '$'
+# MINILISP_PARSER_CACHE overrides where generated modules are kept, e.g. when the
+# package directory is read-only
+CACHE_DIR = os.environ.get('MINILISP_PARSER_CACHE') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '__parsercache__'
+)
+
+
+class GrammarError(Exception):
+    #raised when the parse table is not a valid LL(1) table for its own grammar
+    def __init__(self, conflicts):
+        super().__init__("Grammar is not LL(1):\n  " + "\n  ".join(conflicts))
+        self.conflicts = conflicts
+
+
+# grammar analysis
+
+def is_nonterminal(symbol):
+    return symbol.startswith('<')
+
+
+def grammar_from_table(table):
+    '''
+    recovers the productions of each nonterminal from the table entries.
+    epsilon productions ([''] in the table) become empty tuples.
+    nonterminals and productions keep the order they first appear in the table
+    '''
+    grammar = {}
+    for (nonterminal, _), production in table.items():
+        rhs = tuple(symbol for symbol in production if symbol != EPSILON)
+        alternatives = grammar.setdefault(nonterminal, [])
+        if rhs not in alternatives:
+            alternatives.append(rhs)
+    return grammar
+
+
+def terminals_of(grammar, table):
+    seen = [END]
+    for (_, token), _ in table.items():
+        if token not in seen:
+            seen.append(token)
+    for alternatives in grammar.values():
+        for rhs in alternatives:
+            for symbol in rhs:
+                if not is_nonterminal(symbol) and symbol not in seen:
+                    seen.append(symbol)
+    return seen
+
+
+def first_of_sequence(symbols, first):
+    result = set()
+    for symbol in symbols:
+        if not is_nonterminal(symbol):
+            result.add(symbol)
+            return result
+        result |= first[symbol] - {EPSILON}
+        if EPSILON not in first[symbol]:
+            return result
+    result.add(EPSILON)
+    return result
+
+
+def compute_first(grammar):
+    first = {nonterminal: set() for nonterminal in grammar}
+    changed = True
+    while changed:
+        changed = False
+        for nonterminal, alternatives in grammar.items():
+            for rhs in alternatives:
+                new = first_of_sequence(rhs, first)
+                if not new <= first[nonterminal]:
+                    first[nonterminal] |= new
+                    changed = True
+    return first
+
+
+def compute_follow(grammar, first, start):
+    follow = {nonterminal: set() for nonterminal in grammar}
+    follow[start].add(END)
+    changed = True
+    while changed:
+        changed = False
+        for nonterminal, alternatives in grammar.items():
+            for rhs in alternatives:
+                for i, symbol in enumerate(rhs):
+                    if not is_nonterminal(symbol):
+                        continue
+                    rest = first_of_sequence(rhs[i + 1:], first)
+                    new = rest - {EPSILON}
+                    if EPSILON in rest:
+                        new |= follow[nonterminal]
+                    if not new <= follow[symbol]:
+                        follow[symbol] |= new
+                        changed = True
+    return follow
+
+
+def predict_table(grammar, first, follow):
+    '''
+    builds the LL(1) table implied by FIRST/FOLLOW.
+    returns (table, conflicts) where table maps (nonterminal, token) -> rhs
+    '''
+    table = {}
+    conflicts = []
+    for nonterminal, alternatives in grammar.items():
+        for rhs in alternatives:
+            lookahead = first_of_sequence(rhs, first)
+            if EPSILON in lookahead:
+                lookahead = (lookahead - {EPSILON}) | follow[nonterminal]
+            for token in sorted(lookahead):
+                existing = table.get((nonterminal, token))
+                if existing is not None and existing != rhs:
+                    conflicts.append(
+                        f"{nonterminal} on {token}: "
+                        f"{_show(existing)} | {_show(rhs)}"
+                    )
+                    continue
+                table[(nonterminal, token)] = rhs
+    return table, conflicts
+
+
+def check_ll1(table, start='<program>'):
+    '''
+    returns a list of human readable problems with the table:
+    FIRST/FIRST and FIRST/FOLLOW conflicts, plus entries that disagree with
+    what the grammar predicts. an empty list means the table is LL(1)
+    '''
+    grammar = grammar_from_table(table)
+    first = compute_first(grammar)
+    follow = compute_follow(grammar, first, start)
+    predicted, conflicts = predict_table(grammar, first, follow)
+
+    for key, production in table.items():
+        rhs = tuple(symbol for symbol in production if symbol != EPSILON)
+        if key not in predicted:
+            conflicts.append(f"{key[0]} on {key[1]}: table entry {_show(rhs)} is never predicted")
+        elif predicted[key] != rhs:
+            conflicts.append(
+                f"{key[0]} on {key[1]}: table has {_show(rhs)} but grammar predicts {_show(predicted[key])}"
+            )
+    for key, rhs in predicted.items():
+        if key not in table:
+            conflicts.append(f"{key[0]} on {key[1]}: missing table entry for {_show(rhs)}")
+    return conflicts
+
+
+def _show(rhs):
+    return ' '.join(rhs) if rhs else 'ε'
+
+
+# code generation
+# tree shapes follow the hand-written parser:
+#   A -> T            [T, value]
+#   A -> B            value of B
+#   A -> ( B )        value of B (bracketing terminals are dropped)
+#   A -> OP x y ...   [OP, x, y, ...] where terminal arguments give their raw value
+#   A -> x ... L      items x ... followed by the items of list nonterminal L,
+#                     unwrapped when there is only one
+# a list nonterminal is one whose productions are ε and a production ending in itself;
+# it is emitted as a loop rather than right recursion.
+
+def list_body(grammar, nonterminal):
+    alternatives = grammar[nonterminal]
+    if len(alternatives) != 2 or () not in alternatives:
+        return None
+    body = alternatives[0] or alternatives[1]
+    if body[-1] != nonterminal:
+        return None
+    return body[:-1]
+
+
+def generate_source(table, start='<program>'):
+    conflicts = check_ll1(table, start)
+    if conflicts:
+        raise GrammarError(conflicts)
+
+    grammar = grammar_from_table(table)
+    first = compute_first(grammar)
+    follow = compute_follow(grammar, first, start)
+    terminals = terminals_of(grammar, table)
+    kind = {name: i for i, name in enumerate(terminals)}
+    index = {nonterminal: i for i, nonterminal in enumerate(grammar)}
+    lists = {nt: list_body(grammar, nt) for nt in grammar}
+    lists = {nt: body for nt, body in lists.items() if body is not None}
+
+    lines = [
+        "# generated by parser_gen.py from parse_table -- do not edit",
+        f"GRAMMAR_HASH = {grammar_hash(table)!r}",
+        "",
+        f"NAMES = {tuple(terminals)!r}",
+        "KINDS = {name: i for i, name in enumerate(NAMES)}",
+        "",
+    ]
+
+    def symbol_code(symbol, var, check, out):
+        '''
+        emits the code consuming one symbol; terminals store their raw value in var
+        '''
+        if is_nonterminal(symbol):
+            out.append(f"    {var}, pos = _p{index[symbol]}(k, v, pos)")
+            return
+        if check:
+            out.append(f"    if k[pos] != {kind[symbol]}:")
+            out.append(f"        raise SyntaxError(f\"Expected {symbol} but found '{{NAMES[k[pos]]}}'\")")
+        if var is not None:
+            out.append(f"    {var} = v[pos]")
+        out.append("    pos += 1")
+
+    def production_code(nonterminal, j, rhs):
+        out = [f"def _p{index[nonterminal]}_{j}(k, v, pos):",
+               f"    # {nonterminal} -> {_show(rhs)}"]
+
+        if not rhs:
+            out.append("    return [], pos")
+        elif len(rhs) == 1 and not is_nonterminal(rhs[0]):
+            out.append(f"    return [{rhs[0]!r}, v[pos]], pos + 1")
+        elif len(rhs) == 1:
+            out.append(f"    return _p{index[rhs[0]]}(k, v, pos)")
+        elif (len(rhs) == 3 and not is_nonterminal(rhs[0]) and is_nonterminal(rhs[1])
+              and not is_nonterminal(rhs[2])):
+            symbol_code(rhs[0], None, False, out)
+            symbol_code(rhs[1], "x1", True, out)
+            symbol_code(rhs[2], None, True, out)
+            out.append("    return x1, pos")
+        elif not is_nonterminal(rhs[0]):
+            symbol_code(rhs[0], None, False, out)
+            names = []
+            for i, symbol in enumerate(rhs[1:], 1):
+                symbol_code(symbol, f"x{i}", True, out)
+                names.append(f"x{i}")
+            out.append(f"    return [{rhs[0]!r}, {', '.join(names)}], pos")
+        else:
+            names = []
+            for i, symbol in enumerate(rhs):
+                symbol_code(symbol, f"x{i}", i > 0, out)
+                names.append(f"x{i}")
+            if rhs[-1] in lists:
+                head = ', '.join(names[:-1])
+                out.append(f"    items = [{head}] + {names[-1]}" if head else f"    items = {names[-1]}")
+                if nonterminal in lists:
+                    out.append("    return items, pos")
+                else:
+                    out.append("    return (items[0] if len(items) == 1 else items), pos")
+            else:
+                out.append(f"    return [{', '.join(names)}], pos")
+        return out
+
+    def flags(tokens):
+        return tuple(name in tokens for name in terminals)
+
+    for nonterminal, alternatives in grammar.items():
+        i = index[nonterminal]
+
+        if nonterminal in lists:
+            body = lists[nonterminal]
+            loop = first_of_sequence(body, first) - {EPSILON}
+            lines.append(f"_C{i} = {flags(loop)!r}")
+            lines.append(f"_S{i} = {flags(follow[nonterminal])!r}")
+            lines.append("")
+            lines.append(f"def _p{i}(k, v, pos):")
+            lines.append(f"    # {nonterminal} -> {_show(body + (nonterminal,))} | ε, as a loop")
+            lines.append("    items = []")
+            lines.append(f"    while _C{i}[k[pos]]:")
+            for j, symbol in enumerate(body):
+                step = []
+                symbol_code(symbol, f"x{j}", j > 0, step)
+                lines.extend("    " + line for line in step)
+                lines.append(f"        items.append(x{j})")
+            lines.append(f"    if not _S{i}[k[pos]]:")
+            lines.append(f"        raise SyntaxError(f\"Unexpected token in {nonterminal}: {{NAMES[k[pos]]}}\")")
+            lines.append("    return items, pos")
+            lines.append("")
+            continue
+
+        for j, rhs in enumerate(alternatives):
+            lines.extend(production_code(nonterminal, j, rhs))
+            lines.append("")
+
+        lines.append(f"def _e{i}(k, v, pos):")
+        lines.append(f"    raise SyntaxError(f\"Unexpected token in {nonterminal}: {{NAMES[k[pos]]}}\")")
+        lines.append("")
+
+        jump = []
+        for name in terminals:
+            rhs = table.get((nonterminal, name))
+            if rhs is None:
+                jump.append(f"_e{i}")
+            else:
+                rhs = tuple(symbol for symbol in rhs if symbol != EPSILON)
+                jump.append(f"_p{i}_{alternatives.index(rhs)}")
+        lines.append(f"_T{i} = ({', '.join(jump)},)")
+        lines.append("")
+        lines.append(f"def _p{i}(k, v, pos):")
+        lines.append(f"    return _T{i}[k[pos]](k, v, pos)")
+        lines.append("")
+
+    lines += [
+        "def parse(tokens):",
+        "    try:",
+        "        k = [KINDS[token_type] for token_type, _ in tokens]",
+        "    except KeyError as e:",
+        "        raise SyntaxError(f\"Unknown token kind: {e.args[0]}\") from None",
+        "    v = [token_value for _, token_value in tokens]",
+        "    k.append(0)",
+        "    v.append('$')",
+        f"    result, pos = _p{index[start]}(k, v, 0)",
+        "    if k[pos] != 0:",
+        "        raise SyntaxError(f\"Unexpected tokens after parse: {tokens[pos]}\")",
+        "    return result",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+# on-disk cache
+
+def grammar_hash(table):
+    canonical = repr((GENERATOR_VERSION, sorted((key, list(rhs)) for key, rhs in table.items())))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+_loaded = {}
+
+
+def load_parser(table=parse_table, start='<program>', cache_dir=CACHE_DIR):
+    '''
+    returns the generated parser module for table, generating and caching it on
+    disk the first time a given grammar is seen. use module.parse(tokens).
+    with cache_dir=None, or when cache_dir cannot be written, the module is
+    built in memory instead
+    '''
+    digest = grammar_hash(table)
+    if digest in _loaded:
+        return _loaded[digest]
+
+    module = None
+    if cache_dir is not None:
+        try:
+            module = _load_cached(table, start, cache_dir, digest)
+        except OSError:
+            module = None
+    if module is None:
+        module = types.ModuleType(f"_minilisp_ll1_{digest[:16]}")
+        code = compile(generate_source(table, start), f"<ll1_{digest[:16]}>", 'exec')
+        exec(code, module.__dict__)
+
+    _loaded[digest] = module
+    return module
+
+
+def _load_cached(table, start, cache_dir, digest):
+    path = os.path.join(cache_dir, f"ll1_{digest[:16]}.py")
+    if not os.path.exists(path):
+        source = generate_source(table, start)
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(source)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    spec = importlib.util.spec_from_file_location(f"_minilisp_ll1_{digest[:16]}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if module.GRAMMAR_HASH != digest:
+        # a stale or hand-edited file under the same name; rebuild it
+        os.remove(path)
+        return _load_cached(table, start, cache_dir, digest)
+    return module
+
+
+# benchmark
+
+BENCHMARK_PROGRAMS = [
+    "42",
+    "(+ (× 2 3) 4)",
+    "(? (= x 0) 1 0)",
+    "(≜ x 5 (≜ y 10 (+ x y)))",
+    "((λ x (+ x 1)) 5)",
+    "(f x y z)",
+    "(λ f (λ x (? (= x 0) 1 (× x (f (− x 1))))))",
+    "(+ 1 " * 60 + "2" + ")" * 60,
+]
+
+
+def benchmark(programs=BENCHMARK_PROGRAMS, number=2000):
+    '''
+    times the hand-written parser against the generated one on the same token lists
+    and checks that both build identical trees. returns seconds per full pass
+    '''
+    generated = load_parser()
+    token_lists = [lexer(program) for program in programs]
+    for tokens in token_lists:
+        if generated.parse(tokens) != parser(tokens, parse_table):
+            raise AssertionError(f"Generated parser disagrees on {tokens}")
+
+    def run_hand_written():
+        for tokens in token_lists:
+            parser(tokens, parse_table)
+
+    def run_generated():
+        for tokens in token_lists:
+            generated.parse(tokens)
+
+    hand = min(timeit.repeat(run_hand_written, number=number, repeat=3)) / number
+    fast = min(timeit.repeat(run_generated, number=number, repeat=3)) / number
+    return {"hand_written": hand, "generated": fast}
+
+
+if __name__ == "__main__":
+    grammar = grammar_from_table(parse_table)
+    first = compute_first(grammar)
+    follow = compute_follow(grammar, first, '<program>')
+
+    print("FIRST / FOLLOW")
+    print("=" * 60)
+    for nonterminal in grammar:
+        print(f"{nonterminal}")
+        print(f"  FIRST:  {sorted(first[nonterminal])}")
+        print(f"  FOLLOW: {sorted(follow[nonterminal])}")
+
+    conflicts = check_ll1(parse_table)
+    print("\nLL(1) check: " + ("OK" if not conflicts else "FAILED"))
+    for conflict in conflicts:
+        print(f"  {conflict}")
+
+    if not conflicts:
+        timings = benchmark()
+        print("\nBenchmark (per pass over the sample programs)")
+        print(f"  Hand-written: {timings['hand_written'] * 1e6:.1f} µs")
+        print(f"  Generated:    {timings['generated'] * 1e6:.1f} µs")
+        print(f"  Speed-up:     {timings['hand_written'] / timings['generated']:.2f}x")
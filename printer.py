@@ -0,0 +1,153 @@
+import io
+
+from lexer import lexer
+from parser import parser, parse_table
+
+
+# serializer
+# turns trees back into MiniLisp source. it accepts both tree formats in this repo:
+#   parser():                 ['PLUS', ['NUMBER', 2], ['IDENTIFIER', 'x']]
+#   _finalize_tree_format():  ['PLUS', 2, 'x']
+# a two element list headed by 'NUMBER' or 'IDENTIFIER' is always read as a leaf.
+#
+# the walk uses an explicit stack instead of recursion, so tree depth is not
+# limited by the interpreter, and output goes to the stream in small chunks
+# rather than being joined into one big string first.
+
+SYMBOLS = {
+    'PLUS': '+',
+    'MINUS': '−',
+    'MULT': '×',
+    'EQUALS': '=',
+    'CONDITIONAL': '?',
+    'COND': '?',
+    'LAMBDA': 'λ',
+    'LET': '≜',
+}
+
+BINDERS = {'LAMBDA', 'LET'}
+
+CHUNK = 256
+
+
+def _atom(node):
+    '''
+    returns the source text for a leaf node, or None when node is not a leaf
+    '''
+    if isinstance(node, list):
+        if len(node) == 2 and node[0] == 'NUMBER':
+            return _number(node[1])
+        if len(node) == 2 and node[0] == 'IDENTIFIER':
+            return _identifier(node[1])
+        return None
+    if isinstance(node, int) and not isinstance(node, bool):
+        return _number(node)
+    if isinstance(node, str):
+        return _identifier(node)
+    raise ValueError(f"Cannot serialize {node!r}")
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValueError(f"Cannot serialize number {value!r}")
+    return str(value)
+
+
+def _identifier(name):
+    # the lexer reads a leading λ as LAMBDA, so such a name would not come back intact
+    if not isinstance(name, str) or not name.isalpha() or name[0] == 'λ':
+        raise ValueError(f"Cannot serialize identifier {name!r}")
+    return name
+
+
+def _split(node):
+    '''
+    splits a compound node into the text after '(' and the child expressions
+    '''
+    head = node[0]
+    if isinstance(head, str) and head in SYMBOLS:
+        if head in BINDERS:
+            if len(node) < 3:
+                raise ValueError(f"Malformed {head} node: {node!r}")
+            return f"{SYMBOLS[head]} {_identifier(node[1])}", node[2:]
+        return SYMBOLS[head], node[1:]
+
+    # application
+    if len(node) < 2:
+        raise ValueError(f"Application needs at least two expressions: {node!r}")
+    return None, node
+
+
+def dump(tree, stream, indent=None):
+    '''
+    writes tree to stream as MiniLisp source.
+    indent=None gives the compact one-line form; an int puts each argument of a
+    non-trivial expression on its own line, indented by that many spaces per level
+    '''
+    out = []
+    write = stream.write
+
+    # work items are either literal strings or (node, level) pairs
+    stack = [(tree, 0)]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            out.append(item)
+        else:
+            node, level = item
+            text = _atom(node)
+            if text is not None:
+                out.append(text)
+            else:
+                head, children = _split(node)
+                flat = indent is None or all(_atom(child) is not None for child in children)
+                if flat:
+                    separator = ' '
+                else:
+                    separator = '\n' + ' ' * (indent * (level + 1))
+
+                out.append('(')
+                pending = [')']
+                for child in reversed(children[1:] if head is None else children):
+                    pending.append((child, level + 1))
+                    pending.append(separator)
+                if head is None:
+                    pending.append((children[0], level + 1))
+                else:
+                    out.append(head)
+                stack.extend(pending)
+
+        if len(out) >= CHUNK:
+            write(''.join(out))
+            out.clear()
+
+    if out:
+        write(''.join(out))
+
+
+def dumps(tree, indent=None):
+    stream = io.StringIO()
+    dump(tree, stream, indent)
+    return stream.getvalue()
+
+
+if __name__ == "__main__":
+    examples = [
+        "42",
+        "(+ (× 2 3) 4)",
+        "(? (= x 0) 1 0)",
+        "((λ x (+ x 1)) 5)",
+        "(≜ x 5 (≜ y 10 (+ x y)))",
+        "(f (g x) y z)",
+        "(≜ fact (λ n (? (= n 0) 1 (× n (fact (− n 1))))) (fact 5))",
+    ]
+
+    for source in examples:
+        tree = parser(lexer(source), parse_table)
+        compact = dumps(tree)
+        pretty = dumps(tree, indent=2)
+        assert parser(lexer(compact), parse_table) == tree
+        assert parser(lexer(pretty), parse_table) == tree
+        print(compact)
+        print(pretty)
+        print()
@@ -0,0 +1,233 @@
+import sys
+import time
+
+from evaluator import EvaluationError, Evaluator
+from lexer import lexer
+from parser import parser, parse_table
+from scope import resolve
+
+
+# evaluation profiler
+# ProfilingEvaluator hands a Profiler to the evaluator's work loop, which then
+# times every application site and every lambda call. the plain Evaluator has
+# profiler = None and only pays a None check per application and closure.
+#
+# costs are mapped back to source text through the token positions from
+# lexer(..., positions=...) and the node spans from parser(..., spans=...).
+# per entry we keep call counts, cumulative time (outermost activations only,
+# so recursion is not double counted), self time (minus time spent in nested
+# entries) and allocations (frames and closures created while it is innermost).
+
+ROOT = '<program>'
+LABEL_WIDTH = 40
+
+
+class ProfileEntry:
+    def __init__(self, node, kind, label, location):
+        self.node = node            # held so the id() key in Profiler.entries stays unique
+        self.kind = kind            # 'lambda', 'site' or 'program'
+        self.label = label
+        self.location = location    # "line:col" of the source span, or None
+        self.calls = 0
+        self.cumulative = 0.0
+        self.self_time = 0.0
+        self.allocations = 0
+        self.active = 0
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "label": self.label,
+            "location": self.location,
+            "calls": self.calls,
+            "cumulative_ms": self.cumulative * 1000,
+            "self_ms": self.self_time * 1000,
+            "allocations": self.allocations,
+        }
+
+
+class _PathNode:
+    # one node per distinct call path; children are interned by label, so entering
+    # a frame is a dict lookup however deep the stack is
+    __slots__ = ('parent', 'label', 'children', 'self_time')
+
+    def __init__(self, parent, label):
+        self.parent = parent
+        self.label = label
+        self.children = {}
+        self.self_time = 0.0
+
+
+class Profiler:
+    def __init__(self, source=None, positions=None, spans=None, clock=time.perf_counter):
+        self.source = source
+        self.positions = positions
+        self.spans = spans or {}
+        self.clock = clock
+        self.entries = {}
+        self.stack = []          # [entry, start, child_time, path node]
+        self.paths = _PathNode(None, None)
+
+    # recording
+
+    def enter(self, node, kind):
+        key = ROOT if kind == 'program' else id(node)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self._new_entry(node, kind)
+            self.entries[key] = entry
+        entry.calls += 1
+        entry.active += 1
+        parent = self.stack[-1][3] if self.stack else self.paths
+        path = parent.children.get(entry.label)
+        if path is None:
+            path = _PathNode(parent, entry.label)
+            parent.children[entry.label] = path
+        self.stack.append([entry, self.clock(), 0.0, path])
+
+    def exit(self):
+        entry, start, child_time, path = self.stack.pop()
+        elapsed = self.clock() - start
+        own = elapsed - child_time
+        entry.self_time += own
+        entry.active -= 1
+        if entry.active == 0:
+            entry.cumulative += elapsed
+        if self.stack:
+            self.stack[-1][2] += elapsed
+        path.self_time += own
+
+    def allocated(self, count=1):
+        if self.stack:
+            self.stack[-1][0].allocations += count
+
+    def _new_entry(self, node, kind):
+        if kind == 'program':
+            return ProfileEntry(node, kind, ROOT, None)
+
+        text, location = self._source_of(node)
+        if text is None:
+            # no spans available; fall back to a name from the tree itself
+            text = f"λ {node[1]}" if kind == 'lambda' else "application"
+        label = text if location is None else f"{text} @{location}"
+        return ProfileEntry(node, kind, label, location)
+
+    def _source_of(self, node):
+        span = self.spans.get(id(node))
+        if span is None or self.positions is None or self.source is None:
+            return None, None
+        first, end = span
+        start_offset = self.positions[first][0]
+        end_offset = self.positions[end - 1][1]
+        text = ' '.join(self.source[start_offset:end_offset].split())
+        if len(text) > LABEL_WIDTH:
+            text = text[:LABEL_WIDTH - 1] + '…'
+        line = self.source.count('\n', 0, start_offset) + 1
+        column = start_offset - (self.source.rfind('\n', 0, start_offset) + 1) + 1
+        return text, f"{line}:{column}"
+
+    # output
+
+    def report(self, sort='self_ms'):
+        '''
+        returns one dict per lambda / application site, most expensive first
+        '''
+        rows = [entry.to_dict() for entry in self.entries.values()]
+        rows.sort(key=lambda row: row[sort], reverse=True)
+        return rows
+
+    def format_report(self, sort='self_ms', limit=20):
+        lines = [
+            f"{'calls':>8} {'cum ms':>10} {'self ms':>10} {'allocs':>8}  {'kind':<7} source",
+            "-" * 70,
+        ]
+        for row in self.report(sort)[:limit]:
+            lines.append(
+                f"{row['calls']:>8} {row['cumulative_ms']:>10.3f} {row['self_ms']:>10.3f} "
+                f"{row['allocations']:>8}  {row['kind']:<7} {row['label']}"
+            )
+        return "\n".join(lines)
+
+    def folded_stacks(self):
+        '''
+        flamegraph.pl / speedscope "folded" lines: frames joined by ';' then self time in µs
+        '''
+        lines = []
+        labels = []
+        # depth-first over the path tree; None marks leaving a node
+        pending = list(self.paths.children.values())
+        while pending:
+            node = pending.pop()
+            if node is None:
+                labels.pop()
+                continue
+            labels.append(node.label)
+            micros = int(round(node.self_time * 1_000_000))
+            if micros > 0:
+                lines.append(f"{';'.join(labels)} {micros}")
+            pending.append(None)
+            pending.extend(node.children.values())
+        lines.sort()
+        return lines
+
+    def write_folded(self, stream):
+        for line in self.folded_stacks():
+            stream.write(line + "\n")
+
+
+class ProfilingEvaluator(Evaluator):
+    def __init__(self, profiler, env=None, memo=None):
+        super().__init__(env, memo)
+        self.profiler = profiler
+
+    def evaluate(self, tree, spans=None):
+        try:
+            resolution = resolve(tree, spans)
+        except RecursionError:
+            raise EvaluationError("Program nests too deeply to resolve") from None
+        if resolution.spans is not None:
+            self.profiler.spans = resolution.spans
+        return self.run(resolution)
+
+    def run(self, resolution):
+        profiler = self.profiler
+        depth = len(profiler.stack)
+        profiler.enter(resolution.tree, 'program')
+        try:
+            return Evaluator.run(self, resolution)
+        finally:
+            # an error leaves the entries opened inside the work loop unclosed
+            while len(profiler.stack) > depth:
+                profiler.exit()
+
+
+def profile(source, env=None, memo=None, clock=time.perf_counter):
+    '''
+    lexes, parses and evaluates source under the profiler.
+    returns (value, profiler)
+    '''
+    positions = []
+    tokens = lexer(source, positions=positions)
+    spans = {}
+    tree = parser(tokens, parse_table, spans=spans)
+    profiler = Profiler(source, positions, clock=clock)
+    value = ProfilingEvaluator(profiler, env, memo).evaluate(tree, spans)
+    return value, profiler
+
+
+if __name__ == "__main__":
+    program = """
+    (≜ fib (λ n (? (= n 0) 0 (? (= n 1) 1 (+ (fib (− n 1)) (fib (− n 2))))))
+      (≜ square (λ x (× x x))
+        (+ (fib 15) (square 12))))
+    """
+
+    value, profiler = profile(program)
+    print(f"Result: {value}")
+    print()
+    print(profiler.format_report())
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'w', encoding='utf-8') as f:
+            profiler.write_folded(f)
+        print(f"\nFolded stacks saved to {sys.argv[1]}")
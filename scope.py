@@ -0,0 +1,139 @@
+from lexer import lexer
+from parser import parser, parse_table
+
+
+# lexical addressing
+# rewrites a tree from parser() so every variable reference carries the frame
+# address it will live at when evaluated. there is one frame per LAMBDA call
+# (plus one for the top level); the parameter takes slot 0 and every LET inside
+# the same lambda body takes the next free slot of that frame, so an evaluator
+# can use flat lists indexed by slot instead of chained dictionaries.
+#
+# annotated node shapes (extra fields are appended, existing positions are kept):
+#   ['IDENTIFIER', name, (depth, slot)]       bound variable
+#   ['IDENTIFIER', name, None]                free variable
+#   ['LAMBDA', param, body, frame_size, captures]
+#   ['LET', var, value, body, slot]
+# depth counts lambda frames to walk outwards, 0 being the current frame.
+# captures lists (name, depth, slot) for each variable the lambda closes over,
+# addressed from the frame the lambda is created in.
+#
+# ≜ is recursive: the bound name is already in scope inside its own value, so
+# (≜ f (λ n ... (f ...)) ...) can refer to itself.
+
+OPERATORS = {'PLUS', 'MULT', 'EQUALS', 'MINUS', 'CONDITIONAL'}
+
+
+class Resolution:
+    def __init__(self, tree, frame_size, unbound, spans=None):
+        self.tree = tree                  # annotated tree
+        self.frame_size = frame_size      # slots needed by the top-level frame
+        self.unbound = unbound            # free variable names, in order of first use
+        self.spans = spans                # id(annotated node) -> span, when requested
+
+
+class _Frame:
+    def __init__(self, parent):
+        self.parent = parent
+        self.scopes = [{}]
+        self.size = 0
+        self.captures = {}
+
+    def bind(self, name):
+        slot = self.size
+        self.size += 1
+        self.scopes[-1][name] = slot
+        return slot
+
+    def find(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+
+def resolve(tree, spans=None):
+    '''
+    annotates identifiers with (depth, slot) addresses, records closure capture
+    sets on each lambda and collects unbound variables, all in a single walk.
+    spans from parser(..., spans=...) are carried over to the annotated nodes
+    '''
+    unbound = []
+    annotated_spans = None if spans is None else {}
+
+    def lookup(name, frame):
+        crossed = []
+        depth = 0
+        while frame is not None:
+            slot = frame.find(name)
+            if slot is not None:
+                # every lambda frame between the use and the binding closes over it
+                for i, inner in enumerate(crossed):
+                    inner.captures.setdefault(name, (name, depth - i - 1, slot))
+                return (depth, slot)
+            crossed.append(frame)
+            frame = frame.parent
+            depth += 1
+        if name not in unbound:
+            unbound.append(name)
+        return None
+
+    def walk(node, frame):
+        head = node[0]
+
+        if isinstance(head, list):
+            # application: [function, argument, ...]
+            result = [walk(child, frame) for child in node]
+
+        elif head == 'NUMBER':
+            result = ['NUMBER', node[1]]
+
+        elif head == 'IDENTIFIER':
+            result = ['IDENTIFIER', node[1], lookup(node[1], frame)]
+
+        elif head == 'LAMBDA':
+            inner = _Frame(frame)
+            inner.bind(node[1])
+            body = walk(node[2], inner)
+            result = ['LAMBDA', node[1], body, inner.size, tuple(inner.captures.values())]
+
+        elif head == 'LET':
+            frame.scopes.append({})
+            slot = frame.bind(node[1])
+            value = walk(node[2], frame)
+            body = walk(node[3], frame)
+            frame.scopes.pop()
+            result = ['LET', node[1], value, body, slot]
+
+        elif head in OPERATORS:
+            result = [head] + [walk(child, frame) for child in node[1:]]
+
+        else:
+            raise SyntaxError(f"Unknown node in tree: {head}")
+
+        if annotated_spans is not None:
+            span = spans.get(id(node))
+            if span is not None:
+                annotated_spans[id(result)] = span
+        return result
+
+    top = _Frame(None)
+    annotated = walk(tree, top)
+    return Resolution(annotated, top.size, unbound, annotated_spans)
+
+
+if __name__ == "__main__":
+    examples = [
+        "(λ x x)",
+        "(λ x (λ y (+ x y)))",
+        "(≜ y 10 (+ y z))",
+        "(λ a (≜ b 2 (λ c (× a (+ b c)))))",
+        "(≜ fact (λ n (? (= n 0) 1 (× n (fact (− n 1))))) (fact 5))",
+    ]
+
+    for source in examples:
+        resolution = resolve(parser(lexer(source), parse_table))
+        print(f"{source}")
+        print(f"  tree:    {resolution.tree}")
+        print(f"  frame:   {resolution.frame_size} slot(s)")
+        print(f"  unbound: {resolution.unbound}")
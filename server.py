@@ -0,0 +1,260 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+from lexer import Limits
+from parser import guarded_parse
+
+
+# framing
+# every message is a 4 byte big-endian length followed by that many bytes.
+# requests carry UTF-8 MiniLisp source, responses carry a UTF-8 JSON object:
+#   {"ok": true, "tree": [...]}
+#   {"ok": false, "error": "SyntaxError", "message": "..."}
+
+HEADER = struct.Struct('>I')
+MAX_FRAME = 1 << 20
+
+
+class ProtocolError(Exception):
+    #raised when a peer sends a frame that breaks the framing rules
+    pass
+
+
+async def read_frame(reader):
+    '''
+    reads one length-prefixed frame, returns None on a clean end of stream
+    '''
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ProtocolError("Truncated frame header")
+    (length,) = HEADER.unpack(header)
+    if length > MAX_FRAME:
+        raise ProtocolError(f"Frame of {length} bytes exceeds limit of {MAX_FRAME}")
+    return await reader.readexactly(length)
+
+
+def write_frame(writer, payload):
+    writer.write(HEADER.pack(len(payload)) + payload)
+
+
+# worker side
+# these run inside the process pool, so they must stay importable at module level.
+
+LIMITS = Limits()
+
+
+def parse_source(source):
+    try:
+        return {"ok": True, "tree": guarded_parse(source, LIMITS)}
+    except (SyntaxError, ValueError) as e:
+        return {"ok": False, "error": type(e).__name__, "message": str(e)}
+
+
+def parse_batch(sources):
+    '''
+    parses a list of sources in one worker round trip and returns encoded responses
+    '''
+    return [json.dumps(parse_source(source)).encode('utf-8') for source in sources]
+
+
+# micro-batching
+
+class Batcher:
+    '''
+    collects small requests for up to max_delay seconds (or max_batch requests)
+    and ships them to the worker pool together, so the per-task pickling and
+    scheduling cost is paid once per batch instead of once per request.
+    requests bigger than small_bytes skip the queue and are sent on their own.
+    '''
+
+    def __init__(self, executor, max_batch=64, max_delay=0.002, small_bytes=4096):
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.small_bytes = small_bytes
+        self.pending = []
+        self.flush_handle = None
+
+    def submit(self, source):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if len(source) > self.small_bytes:
+            self._dispatch([(source, future)])
+            return future
+
+        self.pending.append((source, future))
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.max_delay, self.flush)
+        return future
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if self.pending:
+            batch, self.pending = self.pending, []
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        '''
+        runs one batch on the pool and resolves each request's future from the result list
+        '''
+        loop = asyncio.get_running_loop()
+        done = loop.run_in_executor(self.executor, parse_batch, [source for source, _ in batch])
+
+        def fan_out(task):
+            for i, (_, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if task.cancelled():
+                    future.cancel()
+                elif task.exception() is not None:
+                    future.set_exception(task.exception())
+                else:
+                    future.set_result(task.result()[i])
+
+        done.add_done_callback(fan_out)
+
+
+# server
+
+class ParseServer:
+    '''
+    long-running parse service.
+
+    max_inflight bounds the number of requests being parsed across all
+    connections. per connection at most max_pipeline responses may be
+    outstanding; once that many are queued the server stops reading from the
+    socket, which pushes back on the client through the transport buffers.
+    responses are always written in request order.
+    '''
+
+    def __init__(self, workers=None, max_inflight=256, max_pipeline=32,
+                 max_batch=64, max_delay=0.002):
+        # workers start lazily, on the first request; forked ones would inherit the
+        # listening socket and any open client connections and hold them open
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('forkserver')
+        )
+        self.batcher = Batcher(self.executor, max_batch=max_batch, max_delay=max_delay)
+        self.inflight = asyncio.Semaphore(max_inflight)
+        self.max_pipeline = max_pipeline
+
+    async def handle(self, reader, writer):
+        outgoing = asyncio.Queue(maxsize=self.max_pipeline)
+        sender = asyncio.create_task(self._send(outgoing, writer))
+        try:
+            while True:
+                try:
+                    frame = await read_frame(reader)
+                except ProtocolError as e:
+                    await outgoing.put(_error_response("ProtocolError", str(e)))
+                    break
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if frame is None:
+                    break
+
+                try:
+                    source = frame.decode('utf-8')
+                except UnicodeDecodeError as e:
+                    await outgoing.put(_error_response("UnicodeDecodeError", str(e)))
+                    continue
+
+                await self.inflight.acquire()
+                future = self.batcher.submit(source)
+                future.add_done_callback(lambda _: self.inflight.release())
+                await outgoing.put(future)
+        finally:
+            await outgoing.put(None)
+            await sender
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _send(self, outgoing, writer):
+        broken = False
+        while True:
+            item = await outgoing.get()
+            if item is None:
+                return
+            try:
+                payload = await item
+            except Exception as e:
+                payload = json.dumps({"ok": False, "error": type(e).__name__,
+                                      "message": str(e)}).encode('utf-8')
+            if broken:
+                continue
+            try:
+                write_frame(writer, payload)
+                await writer.drain()
+            except ConnectionError:
+                # keep draining the queue so the reader side is never left blocked
+                broken = True
+
+    def close(self):
+        self.batcher.flush()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _error_response(error, message):
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(json.dumps({"ok": False, "error": error,
+                                  "message": message}).encode('utf-8'))
+    return future
+
+
+async def serve(host='127.0.0.1', port=7878, unix_path=None, **options):
+    service = ParseServer(**options)
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.unlink(unix_path)
+        server = await asyncio.start_unix_server(service.handle, path=unix_path)
+        where = unix_path
+    else:
+        server = await asyncio.start_server(service.handle, host, port)
+        where = f"{host}:{port}"
+
+    print(f"MiniLisp parse server listening on {where}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="MiniLisp parse server")
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=7878)
+    arg_parser.add_argument('--unix', dest='unix_path', default=None,
+                            help="listen on a Unix domain socket instead of TCP")
+    arg_parser.add_argument('--workers', type=int, default=None)
+    arg_parser.add_argument('--max-inflight', type=int, default=256)
+    arg_parser.add_argument('--max-pipeline', type=int, default=32)
+    arg_parser.add_argument('--max-batch', type=int, default=64)
+    arg_parser.add_argument('--max-delay', type=float, default=0.002,
+                            help="seconds to wait while filling a batch")
+    args = arg_parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix_path,
+                          workers=args.workers,
+                          max_inflight=args.max_inflight,
+                          max_pipeline=args.max_pipeline,
+                          max_batch=args.max_batch,
+                          max_delay=args.max_delay))
+    except KeyboardInterrupt:
+        pass